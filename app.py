@@ -1,9 +1,24 @@
+import atexit
+import dataclasses
+import gzip
+import json
+import logging
 import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+import numpy as np
+import random
 import requests
 import streamlit as st
+from collections import OrderedDict
 from contextlib import contextmanager
 
-st.set_page_config(page_title="나와 어울리는 영화는?", page_icon="🎬", layout="wide")
+logger = logging.getLogger(__name__)
 
 # -----------------------------
 # TMDB 설정
@@ -20,6 +35,16 @@ ID_TO_KEY = {v["id"]: k for k, v in GENRES.items()}
 
 POSTER_BASE_URL = "https://image.tmdb.org/t/p/w500"
 
+# 목록(discover/recommendations/similar)은 한 언어로만 받아서 언어 무관 필드만 영화 id별로 한 번 저장하고,
+# 제목/줄거리/포스터는 화면에 나갈 k개만 표시 언어로 따로 받는다.
+BASE_LANGUAGE = "ko-KR"
+LANGUAGES = {
+    "한국어": "ko-KR",
+    "English": "en-US",
+    "日本語": "ja-JP",
+}
+NEUTRAL_FIELDS = ["id", "genre_ids", "vote_average", "vote_count", "popularity", "release_date", "original_title"]
+
 # 장르별 성격(대략값): light(가벼움), pace(속도감), escape(현실탈출),
 # emotion(감정선), complexity(복잡도/두뇌), relationship(관계서사)
 GENRE_TRAITS = {
@@ -35,6 +60,51 @@ GENRE_TRAITS = {
 BAYES_C = 6.8   # 전체 평균 평점(대략)
 BAYES_M = 500   # 신뢰 임계 투표수
 
+@dataclass(frozen=True)
+class RankingConfig:
+    """재랭킹/품질필터/MMR 파라미터 묶음. 오프라인 평가(offline.py evaluate)로 튜닝한다."""
+    w_genre: float = 0.45         # 장르 매칭
+    w_align: float = 0.27         # 특성 매칭
+    w_bayes: float = 0.23         # 보정 평점
+    w_pop: float = 0.05           # 인기
+    bayes_c: float = BAYES_C
+    bayes_m: float = BAYES_M
+    mmr_lam: float = 0.78         # 1에 가까울수록 관련도, 0에 가까울수록 다양성
+    quality_thresholds: tuple = (300, 150, 50, 0)   # 투표수 하한을 이 순서로 완화
+    quality_min: int = 25         # 이만큼 남으면 해당 하한에서 멈춘다
+    pool_top: int = 90            # MMR에 넣을 상위 후보 수
+    w_prior: float = 0.05         # 좋아요/별로예요 집계 사전값(피드백 없는 영화는 0)
+
+DEFAULT_RANKING = RankingConfig()
+
+AXES = ["light", "pace", "escape", "emotion", "complexity", "relationship"]
+
+# TMDB 영화 장르 id 전체 -> 비트 위치(장르 비트마스크용)
+TMDB_GENRE_IDS = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37]
+GENRE_BIT = {gid: i for i, gid in enumerate(TMDB_GENRE_IDS)}
+
+# 컬럼형 후보 풀 저장 위치(같은 호스트의 서버 프로세스들이 mmap으로 공유)
+POOL_DIR = os.environ.get("MOVIE_POOL_DIR", os.path.join(tempfile.gettempdir(), "movie_pools"))
+POOL_TTL = 24 * 3600   # 초, 이보다 오래된 풀 디렉터리는 저장 시 정리
+POOL_FORMAT = 3        # 풀 컬럼 구성이 바뀌면 올린다(예전 디렉터리를 재사용하지 않도록)
+POOL_CACHE_ENTRIES = 64      # 프로세스당 열어 두는 mmap 풀 수
+POOL_CACHE_TTL = 3600        # 초, POOL_TTL보다 짧게 해서 정리된 디렉터리를 붙잡고 있지 않게
+
+# 피드백 이벤트 로그(append-only JSONL)와 배치 집계 결과(영화별 좋아요 비율)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDBACK_LOG = os.environ.get("MOVIE_FEEDBACK_LOG", os.path.join(APP_DIR, "feedback_log.jsonl"))
+FEEDBACK_PRIOR = os.environ.get("MOVIE_FEEDBACK_PRIOR", os.path.join(APP_DIR, "feedback_prior.json"))
+
+# TMDB 호출 방식: live(기본) / record(실제 응답을 픽스처로 저장) / replay(픽스처만 사용, 네트워크 없음)
+TMDB_TRANSPORT = os.environ.get("TMDB_TRANSPORT", "live")
+TMDB_FIXTURES = os.environ.get("TMDB_FIXTURES", os.path.join(APP_DIR, "tmdb_fixtures.json.gz"))
+
+# 추천 결과 캐시(양자화 프로필 키, 세션 간 공유)
+RESULT_CACHE_GRID = 0.05   # 축 반올림 간격
+RESULT_CACHE_GENRE_GRID = 0.1   # 장르 가중치 반올림 간격(gmatch가 크기를 쓰므로 키에 포함)
+RESULT_CACHE_SIZE = 512    # LRU 최대 항목 수
+RESULT_CACHE_TTL = 3600    # 초
+
 # -----------------------------
 # 유틸/캐시
 # -----------------------------
@@ -54,8 +124,147 @@ def safe_year(release_date: str):
     except Exception:
         return None
 
+def neutral_fields(movie):
+    """언어와 무관한 필드만 남긴다. (완성도 패널티용으로 포스터/줄거리 유무만 플래그로 보관)"""
+    out = {k: movie.get(k) for k in NEUTRAL_FIELDS if k in movie}
+    out["has_poster"] = bool(movie.get("poster_path"))
+    out["has_overview"] = bool((movie.get("overview") or "").strip())
+    return out
+
+class TmdbTransport:
+    """
+    tmdb_* 함수들이 공통으로 쓰는 GET.
+    - live: 그대로 요청
+    - record: 요청 후 응답을 메모리에 모았다가 flush()(또는 종료 시)에 gzip JSON 픽스처로 저장(키에서 api_key 제외)
+    - replay: 픽스처에서만 응답. latency/jitter(초)만큼 지연, error_rate 확률로 HTTPError
+      지연/오류는 (seed, 키, 그 키의 몇 번째 호출)로 정해져서 스레드 순서와 무관하게 재현된다
+    """
+
+    def __init__(self, mode="live", path=TMDB_FIXTURES, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"unknown TMDB transport mode: {mode}")
+        self.mode = mode
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._fixtures = {}
+        self._dirty = False
+        if mode in ("record", "replay") and os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                self._fixtures = json.load(f)
+        if mode == "record":
+            atexit.register(self.flush)
+
+    @staticmethod
+    def fixture_key(url, params):
+        p = {k: str(v) for k, v in params.items() if k != "api_key"}
+        return url + "?" + "&".join(f"{k}={p[k]}" for k in sorted(p))
+
+    def get(self, url, params):
+        if self.mode == "live":
+            return self._fetch(url, params)
+
+        key = self.fixture_key(url, params)
+        if self.mode == "record":
+            data = self._fetch(url, params)
+            with self._lock:
+                self._fixtures[key] = data
+                self._dirty = True
+            return data
+
+        with self._lock:
+            n = self._calls.get(key, 0)
+            self._calls[key] = n + 1
+        # 문자열 시드는 프로세스마다 달라지는 hash()를 거치지 않는다
+        rng = random.Random(f"{self.seed}|{key}|{n}")
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        fail = rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise requests.HTTPError(f"injected error: {key}")
+        if key not in self._fixtures:
+            raise requests.ConnectionError(f"no fixture recorded: {key}")
+        return self._fixtures[key]
+
+    def _fetch(self, url, params):
+        r = requests.get(url, params=params, timeout=10)
+        r.raise_for_status()
+        return r.json()
+
+    def flush(self):
+        """녹화한 응답을 아카이브에 한 번에 쓴다. 바뀐 게 없으면 아무것도 안 한다."""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = self.path + ".tmp"
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(self._fixtures, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def __len__(self):
+        return len(self._fixtures)
+
+_transport = None
+
+@st.cache_resource(show_spinner=False)
+def default_transport():
+    """환경 변수로 정한 전송 계층. 서버 프로세스에 하나(재실행마다 픽스처를 다시 읽거나 녹화가 갈라지지 않게)."""
+    return TmdbTransport(
+        TMDB_TRANSPORT,
+        latency=float(os.environ.get("TMDB_REPLAY_LATENCY", 0) or 0),
+        jitter=float(os.environ.get("TMDB_REPLAY_JITTER", 0) or 0),
+        error_rate=float(os.environ.get("TMDB_REPLAY_ERROR_RATE", 0) or 0),
+    )
+
+def get_transport():
+    # TmdbTransport는 __len__이 있어서 비어 있으면 거짓이다
+    return _transport if _transport is not None else default_transport()
+
+def set_transport(transport):
+    """오프라인 도구/테스트에서 전송 계층을 바꿀 때. tmdb_* 캐시도 비운다."""
+    global _transport
+    _transport = transport
+    clear_tmdb_cache()
+
+def clear_tmdb_cache():
+    for fn in (tmdb_discover, tmdb_recommendations, tmdb_similar, tmdb_movie_localized):
+        fn.clear()
+    get_movie_store().clear()
+
+def tmdb_get(url, params):
+    return get_transport().get(url, params)
+
+@st.cache_resource(show_spinner=False)
+def get_movie_store():
+    """
+    movie_id -> 언어 무관 필드. 프로세스에 한 벌.
+    discover/recommendations/similar 캐시는 id 목록만 들고 있어서, 여러 목록에 나온 영화도 한 번만 저장된다.
+    """
+    return {}
+
+def store_movies(results):
+    """목록 응답의 영화들을 저장소에 넣고 id 목록을 돌려준다."""
+    store = get_movie_store()
+    ids = []
+    for m in results:
+        if m.get("id"):
+            store[m["id"]] = neutral_fields(m)
+            ids.append(m["id"])
+    return ids
+
+def movies_by_id(ids):
+    """id 목록 -> 저장소의 영화 dict들(저장소가 비워졌으면 빠진다)."""
+    store = get_movie_store()
+    return [store[i] for i in ids if i in store]
+
 @st.cache_data(show_spinner=False)
-def tmdb_discover(api_key: str, with_genres: str, language: str = "ko-KR", page: int = 1):
+def tmdb_discover(api_key: str, with_genres: str, language: str = BASE_LANGUAGE, page: int = 1):
     url = "https://api.themoviedb.org/3/discover/movie"
     params = {
         "api_key": api_key,
@@ -65,25 +274,39 @@ def tmdb_discover(api_key: str, with_genres: str, language: str = "ko-KR", page:
         "include_adult": "false",
         "page": page,
     }
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    return r.json().get("results", [])
+    return store_movies(tmdb_get(url, params).get("results", []))
 
 @st.cache_data(show_spinner=False)
-def tmdb_recommendations(api_key: str, movie_id: int, language: str = "ko-KR", page: int = 1):
+def tmdb_recommendations(api_key: str, movie_id: int, language: str = BASE_LANGUAGE, page: int = 1):
     url = f"https://api.themoviedb.org/3/movie/{movie_id}/recommendations"
     params = {"api_key": api_key, "language": language, "page": page}
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    return r.json().get("results", [])
+    return store_movies(tmdb_get(url, params).get("results", []))
 
 @st.cache_data(show_spinner=False)
-def tmdb_similar(api_key: str, movie_id: int, language: str = "ko-KR", page: int = 1):
+def tmdb_similar(api_key: str, movie_id: int, language: str = BASE_LANGUAGE, page: int = 1):
     url = f"https://api.themoviedb.org/3/movie/{movie_id}/similar"
     params = {"api_key": api_key, "language": language, "page": page}
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    return r.json().get("results", [])
+    return store_movies(tmdb_get(url, params).get("results", []))
+
+@st.cache_data(show_spinner=False)
+def tmdb_movie_localized(api_key: str, movie_id: int, language: str = BASE_LANGUAGE):
+    """표시용 필드(제목/줄거리/포스터)만 언어별로 받는다."""
+    url = f"https://api.themoviedb.org/3/movie/{movie_id}"
+    params = {"api_key": api_key, "language": language}
+    data = tmdb_get(url, params)
+    return {k: data.get(k) for k in ["title", "overview", "poster_path"]}
+
+def localize_movies(api_key: str, movies, language: str = BASE_LANGUAGE):
+    """최종 추천 k개에만 언어별 필드를 붙인다. 실패해도 언어 무관 필드로 카드는 그린다."""
+    out = []
+    for m in movies:
+        loc = {}
+        try:
+            loc = tmdb_movie_localized(api_key, int(m["id"]), language=language)
+        except requests.RequestException as e:
+            logger.warning("TMDB details failed for %s: %s", m.get("id"), e)
+        out.append({**m, **loc})
+    return out
 
 @contextmanager
 def card_container():
@@ -269,16 +492,20 @@ def genre_match_score(user_genre_w, movie):
 
 def completeness_penalty(movie):
     pen = 0.0
-    if not movie.get("poster_path"):
+    if not movie.get("has_poster", movie.get("poster_path")):
         pen += 0.20
-    if not (movie.get("overview") or "").strip():
+    if not movie.get("has_overview", (movie.get("overview") or "").strip()):
         pen += 0.15
     return pen
 
-def composite_score(profile, movie):
+def composite_score(profile, movie, cfg=DEFAULT_RANKING, prior=None):
     """
     (4) 재랭킹 점수: 취향 매칭 + 품질(보정 평점) + 특성 매칭 + 약간의 인기
+    prior: movie_id -> 좋아요 비율 사전값(-0.5~0.5). None이면 사전값 없음.
+    (앱은 generate_recommendations에서 집계 파일을 한 번 읽어 넘긴다)
     """
+    prior = prior or {}
+
     user_genre_w = profile["genre_w"]
     user_axes = profile["axes"]
 
@@ -289,7 +516,7 @@ def composite_score(profile, movie):
 
     R = float(movie.get("vote_average", 0) or 0)
     v = int(movie.get("vote_count", 0) or 0)
-    bayes = bayesian_rating(R, v)  # 0~10
+    bayes = bayesian_rating(R, v, C=cfg.bayes_c, m=cfg.bayes_m)  # 0~10
     bayes_norm = clamp(bayes / 10.0, 0.0, 1.0)
 
     pop = float(movie.get("popularity", 0) or 0)
@@ -299,16 +526,17 @@ def composite_score(profile, movie):
 
     # 취향 중심 + "좋은 영화" 보정 강화
     score = (
-        0.45 * gmatch +
-        0.27 * align +
-        0.23 * bayes_norm +
-        0.05 * pop_norm -
+        cfg.w_genre * gmatch +
+        cfg.w_align * align +
+        cfg.w_bayes * bayes_norm +
+        cfg.w_pop * pop_norm +
+        cfg.w_prior * prior.get(movie.get("id"), 0.0) -
         pen
     )
     return score
 
 # -----------------------------
-# 5) 다양성 선택(MMR)
+# 5) 다양성 선택(MMR)용 유사도 (스칼라 정의. 앱은 similarity_matrix 로 풀 단위 계산)
 # -----------------------------
 def genre_jaccard(a, b):
     ga = set(a.get("genre_ids", []) or [])
@@ -330,43 +558,18 @@ def year_similarity(a, b):
 def similarity(a, b):
     return 0.75 * genre_jaccard(a, b) + 0.25 * year_similarity(a, b)
 
-def mmr_select(candidates, base_scores, k=5, lam=0.78):
-    selected = []
-    remaining = candidates[:]
-
-    remaining.sort(key=lambda m: base_scores.get(m["id"], -1e9), reverse=True)
-    if not remaining:
-        return selected
-    selected.append(remaining.pop(0))
-
-    while remaining and len(selected) < k:
-        best = None
-        best_mmr = -1e9
-        for m in remaining:
-            rel = base_scores.get(m["id"], -1e9)
-            sim = max(similarity(m, s) for s in selected) if selected else 0.0
-            mmr = lam * rel - (1 - lam) * sim
-            if mmr > best_mmr:
-                best_mmr = mmr
-                best = m
-        if best is None:
-            break
-        selected.append(best)
-        remaining = [x for x in remaining if x["id"] != best["id"]]
-    return selected
-
 # -----------------------------
 # 2) 후보 생성 + 3) 추천망 확장 + 4/5) 재랭킹/다양성
 # -----------------------------
-def collect_candidates(api_key: str, profile, per_call=50):
-    top = sorted(profile["genre_w"].items(), key=lambda x: x[1], reverse=True)[:3]
-    top_keys = [k for k, _ in top]
-    top_ids = [GENRES[k]["id"] for k in top_keys]
+def top_genre_ids(profile, n=3):
+    top = sorted(profile["genre_w"].items(), key=lambda x: x[1], reverse=True)[:n]
+    return tuple(GENRES[k]["id"] for k, _ in top)
 
+def collect_candidates(api_key: str, top_ids, per_call=50):
     candidates = {}
     # 단독 장르
     for gid in top_ids:
-        results = tmdb_discover(api_key, str(gid), language="ko-KR", page=1)[:per_call]
+        results = movies_by_id(tmdb_discover(api_key, str(gid), page=1)[:per_call])
         for m in results:
             if m.get("id"):
                 candidates[m["id"]] = m
@@ -374,75 +577,398 @@ def collect_candidates(api_key: str, profile, per_call=50):
     # 혼합 장르(상위 2개, 상위 3개)
     if len(top_ids) >= 2:
         combo = f"{top_ids[0]},{top_ids[1]}"
-        results = tmdb_discover(api_key, combo, language="ko-KR", page=1)[:per_call]
+        results = movies_by_id(tmdb_discover(api_key, combo, page=1)[:per_call])
         for m in results:
             if m.get("id"):
                 candidates[m["id"]] = m
 
     if len(top_ids) >= 3:
         combo3 = f"{top_ids[0]},{top_ids[1]},{top_ids[2]}"
-        results = tmdb_discover(api_key, combo3, language="ko-KR", page=1)[:per_call]
+        results = movies_by_id(tmdb_discover(api_key, combo3, page=1)[:per_call])
         for m in results:
             if m.get("id"):
                 candidates[m["id"]] = m
 
     return list(candidates.values())
 
-def expand_by_graph(api_key: str, seeds, per_seed=30):
+def expand_by_graph(api_key: str, seed_ids, per_seed=30):
     expanded = {}
-    for s in seeds:
-        mid = s.get("id")
-        if not mid:
-            continue
-
+    for mid in seed_ids:
         try:
-            recs = tmdb_recommendations(api_key, int(mid), language="ko-KR", page=1)[:per_seed]
+            recs = movies_by_id(tmdb_recommendations(api_key, int(mid), page=1)[:per_seed])
             for m in recs:
                 if m.get("id"):
                     expanded[m["id"]] = m
-        except Exception:
-            pass
+        except requests.RequestException as e:
+            logger.warning("TMDB recommendations failed for %s: %s", mid, e)
 
         try:
-            sims = tmdb_similar(api_key, int(mid), language="ko-KR", page=1)[:per_seed]
+            sims = movies_by_id(tmdb_similar(api_key, int(mid), page=1)[:per_seed])
             for m in sims:
                 if m.get("id"):
                     expanded[m["id"]] = m
-        except Exception:
-            pass
+        except requests.RequestException as e:
+            logger.warning("TMDB similar failed for %s: %s", mid, e)
 
     return list(expanded.values())
 
-def quality_filter(candidates):
-    thresholds = [300, 150, 50, 0]
-    for t in thresholds:
-        filtered = [m for m in candidates if int(m.get("vote_count", 0) or 0) >= t]
-        if len(filtered) >= 25 or t == 0:
-            return filtered
-    return candidates
-
-def generate_recommendations(api_key: str, profile, final_k=5):
-    base_candidates = collect_candidates(api_key, profile, per_call=55)
-    base_candidates = quality_filter(base_candidates)
+def base_pool(api_key: str, top_ids, cfg=DEFAULT_RANKING):
+    """상위 장르 조합의 기본 후보, 그 컬럼, 품질 필터를 통과한 행."""
+    base_candidates = collect_candidates(api_key, top_ids, per_call=55)
 
-    base_scores = {m["id"]: composite_score(profile, m) for m in base_candidates if m.get("id")}
-    seeds = sorted(base_candidates, key=lambda m: base_scores.get(m["id"], -1e9), reverse=True)[:3]
+    # 기본 풀은 상위 장르 조합에만 의존하므로 모든 세션/프로세스가 같은 풀을 쓴다
+    base_cols = get_pool_columns(base_candidates, shared_key=top_ids)
+    return base_candidates, base_cols, quality_filter_rows(base_cols, cfg)
 
-    expanded = expand_by_graph(api_key, seeds, per_seed=35)
+def merge_pool(api_key: str, base_candidates, seed_ids):
+    expanded = expand_by_graph(api_key, seed_ids, per_seed=35)
 
     merged = {}
     for m in base_candidates + expanded:
         if m.get("id"):
             merged[m["id"]] = m
-    candidates = list(merged.values())
+    return list(merged.values())
 
-    candidates = quality_filter(candidates)
+def generate_recommendations(api_key: str, profile, final_k=5, cfg=DEFAULT_RANKING, prior=None):
+    """
+    (추천, 풀 참조, 풀)
+    - 풀 참조 = (상위 장르 id, 씨드 id). 작아서 공유 캐시에 넣고, rebuild_pool로 같은 후보 풀을 다시 만든다
+    - 풀 = {"movies": 후보 리스트, "cols": 랭킹에 쓴 컬럼(유사도 행렬 포함)}. "비슷한 영화 더 보기"가 그대로 쓴다
+    """
+    if prior is None:
+        prior = get_feedback_prior()
+    top_ids = top_genre_ids(profile)
+    base_candidates, base_cols, rows = base_pool(api_key, top_ids, cfg)
+    base_scores = composite_scores_rows(profile, base_cols, rows, cfg, prior)
+    seed_rows = rows[np.argsort(-base_scores, kind="stable")][:3]
+    seed_ids = tuple(int(base_cols["id"][i]) for i in seed_rows)
+
+    candidates = merge_pool(api_key, [base_candidates[i] for i in rows], seed_ids)
+    cols = get_pool_columns(candidates)
+
+    selected, _ = rank_candidates(profile, candidates, final_k=final_k, cfg=cfg, prior=prior, cols=cols)
+    return selected, (top_ids, seed_ids), {"movies": candidates, "cols": cols}
+
+def rebuild_pool(api_key: str, pool_ref, cfg=DEFAULT_RANKING):
+    """공유 캐시에서 추천만 받은 세션용. 캐시된 TMDB 응답으로 generate_recommendations와 같은 풀을 만든다."""
+    top_ids, seed_ids = pool_ref
+    base_candidates, _, rows = base_pool(api_key, top_ids, cfg)
+    candidates = merge_pool(api_key, [base_candidates[i] for i in rows], seed_ids)
+    return {"movies": candidates, "cols": get_pool_columns(candidates)}
+
+def rank_candidates(profile, candidates, final_k=5, cfg=DEFAULT_RANKING, prior=None, cols=None):
+    """후보 풀 -> 품질 필터 -> 재랭킹 -> MMR. (네트워크 없이 오프라인 평가에서도 재사용, prior=None이면 사전값 없음)"""
+    if cols is None:
+        cols = get_pool_columns(candidates)
+    rows = quality_filter_rows(cols, cfg)
+    rel = composite_scores_rows(profile, cols, rows, cfg, prior)
+
+    order = np.argsort(-rel, kind="stable")[:cfg.pool_top]
+    picked = mmr_select_rows(cols, rows[order], rel[order], k=final_k, lam=cfg.mmr_lam)
+
+    selected = [candidates[i] for i in picked]
+    scores = {int(cols["id"][r]): float(s) for r, s in zip(rows, rel)}
+    return selected, scores
+
+# -----------------------------
+# 6) 양자화 프로필 기반 결과 캐시(세션 간 공유)
+# -----------------------------
+def quantize_profile(profile, grid=RESULT_CACHE_GRID, genre_grid=RESULT_CACHE_GENRE_GRID):
+    """
+    비슷한 프로필을 같은 키로 묶는다.
+    - 상위 3개 장르 순서(후보 수집이 여기에만 의존)
+    - 장르 가중치를 genre_grid 간격으로 반올림한 격자 인덱스
+    - 축 값을 grid 간격으로 반올림한 격자 인덱스
+    """
+    genre_w = profile["genre_w"]
+    top = sorted(genre_w.items(), key=lambda x: x[1], reverse=True)[:3]
+    top_keys = tuple(k for k, _ in top)
+    genre_q = tuple(int(round(genre_w.get(k, 0.0) / genre_grid)) for k in GENRES)
+    axes = profile["axes"]
+    axes_q = tuple(int(round(axes[a] / grid)) for a in AXES)
+    return (top_keys, genre_q, axes_q)
+
+class RecommendationCache:
+    """양자화 키 -> (추천, 풀 참조). TTL + LRU, 조회/저장 모두 O(1)."""
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """서버 프로세스 하나에 캐시 하나(모든 세션이 공유)."""
+    return RecommendationCache()
+
+def has_feedback(fb):
+    return any(v != 0.0 for part in fb.values() for v in part.values())
+
+def cached_recommendations(api_key: str, profile, final_k=5, cfg=DEFAULT_RANKING, shared=True):
+    """
+    (추천, 풀 참조, 풀). 공유 캐시에는 추천과 풀 참조만 넣으므로 적중하면 풀은 None이다
+    ("비슷한 영화 더 보기"를 누를 때 rebuild_pool로 만든다).
+    shared=False면 공유 캐시를 건너뛴다. 피드백이 반영된 프로필은 양자화하면
+    피드백 전과 같은 키가 되기 쉬워서, 피드백이 무시되지 않도록 항상 새로 계산한다.
+    """
+    prior_mtime = feedback_prior_mtime()
+    prior = get_feedback_prior(mtime=prior_mtime)
+    if not shared:
+        return generate_recommendations(api_key, profile, final_k=final_k, cfg=cfg, prior=prior)
+    cache = get_result_cache()
+    # 집계 파일이 새로 써지면 키가 바뀌어 TTL을 기다리지 않고 새 사전값을 반영한다
+    # cfg는 값으로 넣는다(Streamlit 재실행마다 RankingConfig 클래스가 새로 정의돼 인스턴스끼리는 같지 않다)
+    key = (quantize_profile(profile), final_k, dataclasses.astuple(cfg), prior_mtime)
+    hit = cache.get(key)
+    if hit is not None:
+        selected, pool_ref = hit
+        return selected, pool_ref, None
+    selected, pool_ref, pool = generate_recommendations(api_key, profile, final_k=final_k, cfg=cfg, prior=prior)
+    cache.put(key, (selected, pool_ref))
+    return selected, pool_ref, pool
 
-    scores = {m["id"]: composite_score(profile, m) for m in candidates if m.get("id")}
-    candidates_sorted = sorted(candidates, key=lambda m: scores.get(m["id"], -1e9), reverse=True)[:90]
+# -----------------------------
+# 7) 컬럼형 후보 풀(NumPy)
+# - 행 i == 풀을 만든 후보 리스트의 i번째 영화
+# - 장르 조합별 기본 후보 풀(shared_key)만 디스크에 써서 프로세스 간 mmap 공유,
+#   요청마다 달라지는 병합 풀은 프로세스 메모리에만 만든다
+# - tmdb_* 캐시(영화 dict)는 여전히 프로세스마다 한 벌이다. 컬럼은 랭킹용 사본이다
+# - offline.py의 참조 구현(quality_filter / mmr_select)과 composite_score 와 같은 결과를 컬럼 연산으로 낸다
+# -----------------------------
+def build_pool_columns(movies):
+    n = len(movies)
+    cols = {
+        "id": np.zeros(n, dtype=np.int64),
+        "genre_mask": np.zeros(n, dtype=np.uint32),
+        "genre_hot": np.zeros((n, len(GENRES)), dtype=np.float64),
+        "traits": np.zeros((n, len(AXES)), dtype=np.float64),
+        "vote_average": np.zeros(n, dtype=np.float64),
+        "vote_count": np.zeros(n, dtype=np.int64),
+        "bayes": np.zeros(n, dtype=np.float64),
+        "pop_norm": np.zeros(n, dtype=np.float64),
+        "penalty": np.zeros(n, dtype=np.float64),
+        "year": np.full(n, -1, dtype=np.int32),
+    }
+    genre_keys = list(GENRES.keys())
+    for i, m in enumerate(movies):
+        gids = m.get("genre_ids", []) or []
+        cols["id"][i] = int(m.get("id") or 0)
+        for gid in gids:
+            if gid in GENRE_BIT:
+                cols["genre_mask"][i] |= np.uint32(1 << GENRE_BIT[gid])
+            k = ID_TO_KEY.get(gid)
+            if k:
+                cols["genre_hot"][i, genre_keys.index(k)] = 1.0
+        t = movie_trait_vector(m)
+        cols["traits"][i] = [t[a] for a in AXES]
+        R = float(m.get("vote_average", 0) or 0)
+        v = int(m.get("vote_count", 0) or 0)
+        cols["vote_average"][i] = R
+        cols["vote_count"][i] = v
+        cols["bayes"][i] = bayesian_rating(R, v)
+        pop = float(m.get("popularity", 0) or 0)
+        cols["pop_norm"][i] = clamp(math.log1p(pop) / math.log1p(1000), 0.0, 1.0)
+        cols["penalty"][i] = completeness_penalty(m)
+        y = safe_year(m.get("release_date", ""))
+        if y is not None:
+            cols["year"][i] = y
+    return cols
+
+def pool_dir(genre_ids):
+    """공유 풀 디렉터리 이름 = 컬럼 구성 버전 + 상위 장르 id 조합."""
+    return os.path.join(POOL_DIR, f"v{POOL_FORMAT}-" + "-".join(str(g) for g in genre_ids))
+
+def save_pool_columns(cols, path):
+    """임시 디렉터리에 쓰고 rename 한다(다른 프로세스가 반쯤 쓴 풀을 읽지 않도록)."""
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, arr in cols.items():
+        np.save(os.path.join(tmp, name + ".npy"), arr)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # 다른 프로세스가 먼저 저장했다
+        shutil.rmtree(tmp, ignore_errors=True)
+
+@st.cache_resource(show_spinner=False, max_entries=POOL_CACHE_ENTRIES, ttl=POOL_CACHE_TTL)
+def load_pool_columns(path):
+    """mmap으로 연다. 물리 메모리는 OS 페이지 캐시 한 벌을 모든 프로세스가 공유한다."""
+    return {
+        name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+        for name in os.listdir(path) if name.endswith(".npy")
+    }
 
-    selected = mmr_select(candidates_sorted, scores, k=final_k, lam=0.78)
-    return selected, scores
+def prune_pool_dir(root=POOL_DIR, max_age=POOL_TTL):
+    now = time.time()
+    for name in os.listdir(root):
+        p = os.path.join(root, name)
+        try:
+            if now - os.path.getmtime(p) > max_age:
+                shutil.rmtree(p, ignore_errors=True)
+        except OSError:
+            pass
+
+def get_pool_columns(movies, shared_key=None):
+    """
+    shared_key(상위 장르 id 조합)가 있으면 디스크 공유 풀을 mmap으로 연다.
+    다른 프로세스가 예전 TMDB 응답으로 만든 풀이면(행 id가 다르면) 이 프로세스 메모리에만 만든다.
+    """
+    if shared_key is None:
+        return build_pool_columns(movies)
+    path = pool_dir(shared_key)
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(POOL_DIR, exist_ok=True)
+            prune_pool_dir()
+            save_pool_columns(build_pool_columns(movies), path)
+        cols = load_pool_columns(path)
+    except OSError:
+        # 디스크를 못 쓰는 환경이면 프로세스 메모리에만 만든다
+        return build_pool_columns(movies)
+    if not np.array_equal(cols["id"], np.array([int(m.get("id") or 0) for m in movies], dtype=np.int64)):
+        return build_pool_columns(movies)
+    return cols
+
+def quality_filter_rows(cols, cfg=DEFAULT_RANKING):
+    vc = cols["vote_count"]
+    thresholds = cfg.quality_thresholds
+    for t in thresholds:
+        rows = np.flatnonzero(vc >= t)
+        if len(rows) >= cfg.quality_min or t == thresholds[-1]:
+            return rows
+    return np.arange(len(vc))
+
+def composite_scores_rows(profile, cols, rows, cfg=DEFAULT_RANKING, prior=None):
+    w = np.array([profile["genre_w"].get(k, 0.0) for k in GENRES], dtype=np.float64)
+    u = np.array([profile["axes"][a] for a in AXES], dtype=np.float64)
+
+    gmatch = np.clip(cols["genre_hot"][rows] @ w, 0.0, 1.0)
+    align = 1.0 - np.sqrt(((cols["traits"][rows] - u) ** 2).sum(axis=1)) / math.sqrt(len(AXES))
+    if (cfg.bayes_c, cfg.bayes_m) == (BAYES_C, BAYES_M):
+        bayes = cols["bayes"][rows]
+    else:
+        v = cols["vote_count"][rows].astype(np.float64)
+        m = cfg.bayes_m
+        bayes = (v / (v + m)) * cols["vote_average"][rows] + (m / (v + m)) * cfg.bayes_c
+    bayes_norm = np.clip(bayes / 10.0, 0.0, 1.0)
+
+    prior = prior or {}
+    prior_col = np.array([prior.get(int(i), 0.0) for i in cols["id"][rows]], dtype=np.float64)
+
+    return (
+        cfg.w_genre * gmatch +
+        cfg.w_align * align +
+        cfg.w_bayes * bayes_norm +
+        cfg.w_pop * cols["pop_norm"][rows] +
+        cfg.w_prior * prior_col -
+        cols["penalty"][rows]
+    )
+
+def popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    x = np.asarray(x, dtype=np.uint32).copy()
+    c = np.zeros(x.shape, dtype=np.uint32)
+    while x.any():
+        c += x & 1
+        x >>= 1
+    return c
+
+def similarity_matrix(genre_mask, year):
+    """
+    풀 전체의 similarity(a, b) 행렬(n x n)을 한 번에 만든다.
+    장르 자카드 = popcount(a & b) / popcount(a | b), 연도 = 10년 차이에서 0이 되는 선형.
+    """
+    a = genre_mask[:, None]
+    b = genre_mask[None, :]
+    inter = popcount(a & b).astype(np.float64)
+    union = popcount(a | b).astype(np.float64)
+    jac = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    ya = year[:, None].astype(np.int64)
+    yb = year[None, :].astype(np.int64)
+    ysim = np.clip(1.0 - np.abs(ya - yb) / 10.0, 0.0, 1.0)
+    ysim = np.where((ya < 0) | (yb < 0), 0.0, ysim)
+
+    return 0.75 * jac + 0.25 * ysim
+
+def pool_similarity(cols):
+    """
+    풀의 유사도 행렬. MMR/이웃 찾기에 쓰는 풀에서만 처음 필요할 때 만들어 cols에 붙여 둔다.
+    (n x n이라 디스크 공유 풀에는 저장하지 않는다)
+    """
+    if "sim" not in cols:
+        cols["sim"] = similarity_matrix(cols["genre_mask"], cols["year"])
+    return cols["sim"]
+
+def mmr_select_rows(cols, rows, rel, k=5, lam=DEFAULT_RANKING.mmr_lam):
+    """rows는 rel 내림차순. 선택된 행 번호들을 돌려준다."""
+    if len(rows) == 0:
+        return []
+    picked = [0]
+    alive = np.ones(len(rows), dtype=bool)
+    alive[0] = False
+    sim = pool_similarity(cols)
+    max_sim = sim[rows[0], rows]
+
+    while alive.any() and len(picked) < k:
+        mmr = np.where(alive, lam * rel - (1 - lam) * max_sim, -np.inf)
+        j = int(np.argmax(mmr))
+        picked.append(j)
+        alive[j] = False
+        max_sim = np.maximum(max_sim, sim[rows[j], rows])
+    return [int(rows[j]) for j in picked]
+
+def similar_in_pool(movie_id, pool, n=4, exclude=()):
+    """
+    후보 풀(generate_recommendations / rebuild_pool의 풀) 안에서 movie_id와 가장 비슷한 영화 n개
+    (유사도, 동점이면 보정 평점 순). 랭킹과 같은 품질 필터를 통과한 영화만 이웃이 된다.
+    풀에 붙어 있는 유사도 행렬 한 행만 읽으므로 /similar 호출도, 행렬 재계산도 필요 없다.
+    """
+    if not pool:
+        return []
+    cols = pool["cols"]
+    hit = np.flatnonzero(cols["id"] == movie_id)
+    if len(hit) == 0:
+        return []
+    i = int(hit[0])
+    rows = quality_filter_rows(cols)
+    order = rows[np.lexsort((-cols["bayes"][rows], -pool_similarity(cols)[i, rows]))]
+    skip = set(exclude) | {movie_id}
+    out = []
+    for r in order:
+        if int(cols["id"][r]) in skip:
+            continue
+        out.append(pool["movies"][r])
+        if len(out) >= n:
+            break
+    return out
 
 def build_reason(profile, movie):
     u = profile["axes"]
@@ -477,27 +1003,39 @@ def build_reason(profile, movie):
 # -----------------------------
 # (8) 피드백 저장/적용
 # -----------------------------
+def empty_feedback():
+    return {
+        "genre_adj": {k: 0.0 for k in GENRES.keys()},
+        "axis_adj": {k: 0.0 for k in ["light", "pace", "escape", "emotion", "complexity", "relationship"]},
+    }
+
 def init_state():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:12]
     if "base_profile" not in st.session_state:
         st.session_state.base_profile = None
     if "feedback" not in st.session_state:
-        st.session_state.feedback = {
-            "genre_adj": {k: 0.0 for k in GENRES.keys()},
-            "axis_adj": {k: 0.0 for k in ["light", "pace", "escape", "emotion", "complexity", "relationship"]},
-        }
+        st.session_state.feedback = empty_feedback()
     if "recs" not in st.session_state:
         st.session_state.recs = None
-
-def add_feedback(movie, like: bool):
+    if "pool" not in st.session_state:
+        st.session_state.pool = None
+    if "pool_ref" not in st.session_state:
+        st.session_state.pool_ref = None
+    if "more_like" not in st.session_state:
+        st.session_state.more_like = None
+
+def apply_feedback_event(fb, genre_ids, like: bool):
+    """피드백 이벤트 하나를 fb(genre_adj/axis_adj)에 바로 더한다. 라이브/재생 모두 이 함수를 쓴다."""
     sign = 1.0 if like else -1.0
 
     # 장르 가중치 조정
-    gids = movie.get("genre_ids", []) or []
+    gids = genre_ids or []
     for gid in gids:
         k = ID_TO_KEY.get(gid)
         if k:
-            st.session_state.feedback["genre_adj"][k] += sign * 0.08
-            st.session_state.feedback["genre_adj"][k] = clamp(st.session_state.feedback["genre_adj"][k], -0.25, 0.25)
+            fb["genre_adj"][k] += sign * 0.08
+            fb["genre_adj"][k] = clamp(fb["genre_adj"][k], -0.25, 0.25)
 
     # 축 조정: 영화 trait 방향으로 살짝 끌어가기(좋아요) / 반대로(별로예요)
     mk = [ID_TO_KEY.get(g) for g in gids if ID_TO_KEY.get(g) in GENRE_TRAITS]
@@ -509,22 +1047,95 @@ def add_feedback(movie, like: bool):
 
         step = 0.05 * sign
         for axis in ["light", "pace", "escape", "emotion", "complexity", "relationship"]:
-            st.session_state.feedback["axis_adj"][axis] += (t[axis] - 0.5) * step
-            st.session_state.feedback["axis_adj"][axis] = clamp(st.session_state.feedback["axis_adj"][axis], -0.20, 0.20)
+            fb["axis_adj"][axis] += (t[axis] - 0.5) * step
+            fb["axis_adj"][axis] = clamp(fb["axis_adj"][axis], -0.20, 0.20)
+    return fb
+
+def add_feedback(movie, like: bool):
+    gids = movie.get("genre_ids", []) or []
+    apply_feedback_event(st.session_state.feedback, gids, like)
+    log_event({
+        "type": "feedback",
+        "session": st.session_state.session_id,
+        "movie_id": movie.get("id"),
+        "genre_ids": gids,
+        "like": bool(like),
+    })
 
 # -----------------------------
-# UI
+# (9) 피드백 이벤트 로그(append-only) + 재생 + 집계 사전값
 # -----------------------------
-init_state()
+_log_lock = threading.Lock()
+
+def log_event(event, path=FEEDBACK_LOG):
+    """한 줄 JSON으로 덧붙인다. 로그를 못 써도 화면 동작은 막지 않는다."""
+    event = {"ts": time.time(), **event}
+    line = json.dumps(event, ensure_ascii=False) + "\n"
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+def read_events(path=FEEDBACK_LOG):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 마지막 줄이 쓰다 끊긴 경우 등
+                continue
+
+def replay_feedback_log(session_id, path=FEEDBACK_LOG):
+    """
+    세션의 이벤트를 순서대로 다시 적용해 (기본 프로필, 피드백)을 복원한다.
+    새 테스트(profile 이벤트)가 나오면 그 전 피드백은 버린다(화면 동작과 동일).
+    """
+    answers = None
+    fb = empty_feedback()
+    for ev in read_events(path):
+        if ev.get("session") != session_id:
+            continue
+        if ev.get("type") == "profile":
+            answers = ev.get("answers")
+            fb = empty_feedback()
+        elif ev.get("type") == "feedback" and answers is not None:
+            apply_feedback_event(fb, ev.get("genre_ids"), ev.get("like"))
+    if answers is None:
+        return None, None
+    return profile_from_answers(answers), fb
 
-st.title("🎬 나와 어울리는 영화는?")
-st.write("심리테스트 10문항으로 취향을 더 촘촘히 잡아서, TMDB 기반으로 맞춤 추천을 해준다 😎")
-st.write("추천 결과에서 👍/👎 피드백을 주면 다음 추천이 더 정확해진다.")
+@st.cache_data(show_spinner=False)
+def load_feedback_prior(path, mtime):
+    """offline.py aggregate-feedback 결과. mtime이 바뀌면 다시 읽는다."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {int(mid): float(v["rate"]) - 0.5 for mid, v in data.items()}
+
+def feedback_prior_mtime(path=FEEDBACK_PRIOR):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
 
-st.sidebar.header("TMDB 설정")
-api_key = st.sidebar.text_input("TMDB API Key", type="password", placeholder="여기에 API Key 입력")
+def get_feedback_prior(path=FEEDBACK_PRIOR, mtime=None):
+    if mtime is None:
+        mtime = feedback_prior_mtime(path)
+    if mtime is None:
+        return {}
+    try:
+        return load_feedback_prior(path, mtime)
+    except (OSError, ValueError, KeyError):
+        return {}
 
-st.divider()
+# -----------------------------
+# UI
+# -----------------------------
 
 # -----------------------------
 # 심리테스트 문항 (기존 5 + 신규 5)
@@ -626,20 +1237,6 @@ QUESTIONS = [
     ),
 ]
 
-selected_indices = []
-for i, (q, options) in enumerate(QUESTIONS, start=1):
-    st.subheader(q)
-    choice = st.radio(label="", options=options, index=None, key=f"q{i}")
-    selected_indices.append(None if choice is None else options.index(choice))
-
-st.divider()
-
-colA, colB = st.columns([1, 1], gap="large")
-with colA:
-    run_btn = st.button("결과 보기", type="primary", use_container_width=True)
-with colB:
-    rerun_btn = st.button("추천 새로 고침(피드백 반영)", use_container_width=True)
-
 def top_genre_title(profile):
     top = sorted(profile["genre_w"].items(), key=lambda x: x[1], reverse=True)[:1]
     if not top:
@@ -647,13 +1244,35 @@ def top_genre_title(profile):
     gk = top[0][0]
     return f"당신에게 딱인 장르는: {GENRES[gk]['name']}!"
 
-def render_results(api_key, base_profile):
+def render_similar(api_key, movie, language=BASE_LANGUAGE, n=4):
+    """카드 아래 "비슷한 영화 더 보기": 이번 후보 풀에서 이웃을 바로 꺼낸다."""
+    exclude = {m["id"] for m in (st.session_state.recs or [])}
+    if st.session_state.pool is None and st.session_state.pool_ref is not None:
+        # 공유 캐시 적중으로 풀이 없으면 한 번 만들어 세션에 둔다(이후 재실행은 행 하나만 읽는다)
+        st.session_state.pool = rebuild_pool(api_key, st.session_state.pool_ref)
+    sims = similar_in_pool(movie.get("id"), st.session_state.pool, n=n, exclude=exclude)
+    if not sims:
+        st.caption("후보 풀에서 비슷한 영화를 찾지 못했다.")
+        return
+    for m in localize_movies(api_key, sims, language=language):
+        title = m.get("title") or m.get("original_title") or "제목 정보 없음"
+        year = safe_year(m.get("release_date", ""))
+        vote = float(m.get("vote_average", 0) or 0)
+        st.write(f"- {title}" + (f" ({year})" if year else "") + f" · ⭐ {vote:.1f}")
+
+def render_results(api_key, base_profile, language=BASE_LANGUAGE):
     profile = apply_feedback_adjustments(base_profile, st.session_state.feedback)
 
     with st.spinner("분석 중..."):
-        recs, _scores = generate_recommendations(api_key, profile, final_k=5)
+        recs, pool_ref, pool = cached_recommendations(
+            api_key, profile, final_k=5, shared=not has_feedback(st.session_state.feedback)
+        )
+        recs = localize_movies(api_key, recs, language=language)
 
     st.session_state.recs = recs
+    st.session_state.pool = pool
+    st.session_state.pool_ref = pool_ref
+    st.session_state.more_like = None
 
     st.markdown(f"# {top_genre_title(profile)}")
     st.write("아래 추천은 **취향(장르+특성) + 보정 평점(신뢰도) + 다양성**까지 고려해서 뽑은 리스트다 👇")
@@ -716,93 +1335,150 @@ def render_results(api_key, base_profile):
                     st.write(f"**줄거리**: {overview}")
                     st.write(f"**이 영화를 추천하는 이유**: {reason}")
 
+                # 클릭 후 재실행은 아래 "결과 유지" 화면으로 가므로 같은 key를 써야 클릭이 이어진다
+                if st.button("🔎 비슷한 영화 더 보기", key=f"more_{mid}_{idx}", use_container_width=True):
+                    st.session_state.more_like = mid
+                if st.session_state.more_like == mid:
+                    render_similar(api_key, movie, language=language)
+
     st.markdown("---")
     st.write("✅ 추천이 마음에 들면 👍, 별로면 👎을 눌러줘. 그 다음 **추천 새로 고침(피드백 반영)**을 누르면 추천이 더 맞춰진다.")
 
-# -----------------------------
-# 버튼 동작
-# -----------------------------
-if run_btn:
-    if not api_key:
-        st.error("사이드바에 TMDB API Key를 입력해줘.")
-        st.stop()
-
-    if any(x is None for x in selected_indices):
-        st.warning("아직 선택하지 않은 질문이 있다. 10개 모두 답해줘!")
-        st.stop()
-
-    # 새 테스트 결과면 피드백 초기화
-    st.session_state.feedback = {
-        "genre_adj": {k: 0.0 for k in GENRES.keys()},
-        "axis_adj": {k: 0.0 for k in ["light", "pace", "escape", "emotion", "complexity", "relationship"]},
-    }
-
-    st.session_state.base_profile = profile_from_answers(selected_indices)
-    render_results(api_key, st.session_state.base_profile)
-
-elif rerun_btn:
-    if not api_key:
-        st.error("사이드바에 TMDB API Key를 입력해줘.")
-        st.stop()
-
-    if st.session_state.base_profile is None:
-        st.warning("먼저 심리테스트를 완료하고 결과를 봐줘!")
-        st.stop()
-
-    render_results(api_key, st.session_state.base_profile)
-
-else:
-    # 결과가 이미 있으면 화면 유지(불필요 API 호출 방지)
-    if st.session_state.base_profile is not None and st.session_state.recs is not None:
-        profile = apply_feedback_adjustments(st.session_state.base_profile, st.session_state.feedback)
-        st.markdown(f"# {top_genre_title(profile)}")
-        st.write("이미 추천이 생성된 상태다. 👍/👎 피드백을 주고 **추천 새로 고침**을 누르면 추천이 더 정확해진다.")
-
-        recs = st.session_state.recs
-        st.markdown("## 🎞️ 추천 영화")
-        cols = st.columns(3, gap="large")
-
-        for idx, movie in enumerate(recs):
-            col = cols[idx % 3]
-
-            mid = movie.get("id")
-            title = movie.get("title") or movie.get("original_title") or "제목 정보 없음"
-            vote = float(movie.get("vote_average", 0) or 0)
-            vcnt = int(movie.get("vote_count", 0) or 0)
-            overview = (movie.get("overview") or "").strip() or "줄거리 정보가 부족하다."
-            poster_url = build_poster_url(movie.get("poster_path"))
-            reason = build_reason(profile, movie)
-
-            with col:
-                with card_container():
-                    if poster_url:
-                        st.image(poster_url, use_container_width=True)
-                    else:
-                        st.write("🖼️ 포스터 없음")
-
-                    st.markdown(f"### {title}")
-                    st.write(f"⭐ 평점: {vote:.1f}  (투표 {vcnt:,}개)")
-
-                    b1, b2 = st.columns(2)
-                    with b1:
-                        like_clicked = st.button("👍 좋아요", key=f"like_keep_{mid}_{idx}", use_container_width=True)
-                    with b2:
-                        dislike_clicked = st.button("👎 별로예요", key=f"dislike_keep_{mid}_{idx}", use_container_width=True)
-
-                    if like_clicked:
-                        add_feedback(movie, like=True)
-                        st.toast("좋아요 반영 완료! 새로 고침하면 더 맞춤 추천이 나온다.", icon="✅")
-
-                    if dislike_clicked:
-                        add_feedback(movie, like=False)
-                        st.toast("별로예요 반영 완료! 새로 고침하면 더 맞춤 추천이 나온다.", icon="✅")
-
-                    with st.expander("상세 정보"):
-                        st.write(f"**줄거리**: {overview}")
-                        st.write(f"**이 영화를 추천하는 이유**: {reason}")
-
-        st.markdown("---")
-        st.write("👉 피드백 후에는 **추천 새로 고침(피드백 반영)** 버튼을 눌러야 추천 리스트가 새로 계산된다.")
-
-
+def main():
+    st.set_page_config(page_title="나와 어울리는 영화는?", page_icon="🎬", layout="wide")
+
+    init_state()
+
+    st.title("🎬 나와 어울리는 영화는?")
+    st.write("심리테스트 10문항으로 취향을 더 촘촘히 잡아서, TMDB 기반으로 맞춤 추천을 해준다 😎")
+    st.write("추천 결과에서 👍/👎 피드백을 주면 다음 추천이 더 정확해진다.")
+
+    st.sidebar.header("TMDB 설정")
+    api_key = st.sidebar.text_input("TMDB API Key", type="password", placeholder="여기에 API Key 입력")
+    lang_label = st.sidebar.selectbox("영화 정보 언어", list(LANGUAGES.keys()))
+    language = LANGUAGES[lang_label]
+
+    st.sidebar.header("이어하기")
+    st.sidebar.caption(f"내 세션 코드: `{st.session_state.session_id}`")
+    restore_code = st.sidebar.text_input("세션 코드", placeholder="이전 세션 코드 입력")
+    if st.sidebar.button("기록 불러오기", use_container_width=True) and restore_code.strip():
+        base, fb = replay_feedback_log(restore_code.strip())
+        if base is None:
+            st.sidebar.warning("해당 코드의 기록이 없다.")
+        else:
+            st.session_state.session_id = restore_code.strip()
+            st.session_state.base_profile = base
+            st.session_state.feedback = fb
+            st.session_state.recs = None
+            st.sidebar.success("불러왔다! **추천 새로 고침**을 눌러줘.")
+
+    st.divider()
+
+    selected_indices = []
+    for i, (q, options) in enumerate(QUESTIONS, start=1):
+        st.subheader(q)
+        choice = st.radio(label="", options=options, index=None, key=f"q{i}")
+        selected_indices.append(None if choice is None else options.index(choice))
+
+    st.divider()
+
+    colA, colB = st.columns([1, 1], gap="large")
+    with colA:
+        run_btn = st.button("결과 보기", type="primary", use_container_width=True)
+    with colB:
+        rerun_btn = st.button("추천 새로 고침(피드백 반영)", use_container_width=True)
+
+    # -----------------------------
+    # 버튼 동작
+    # -----------------------------
+    if run_btn:
+        if not api_key and get_transport().mode != "replay":
+            st.error("사이드바에 TMDB API Key를 입력해줘.")
+            st.stop()
+
+        if any(x is None for x in selected_indices):
+            st.warning("아직 선택하지 않은 질문이 있다. 10개 모두 답해줘!")
+            st.stop()
+
+        # 새 테스트 결과면 피드백 초기화
+        st.session_state.feedback = empty_feedback()
+
+        st.session_state.base_profile = profile_from_answers(selected_indices)
+        log_event({"type": "profile", "session": st.session_state.session_id, "answers": selected_indices})
+        render_results(api_key, st.session_state.base_profile, language=language)
+
+    elif rerun_btn:
+        if not api_key and get_transport().mode != "replay":
+            st.error("사이드바에 TMDB API Key를 입력해줘.")
+            st.stop()
+
+        if st.session_state.base_profile is None:
+            st.warning("먼저 심리테스트를 완료하고 결과를 봐줘!")
+            st.stop()
+
+        render_results(api_key, st.session_state.base_profile, language=language)
 
+    else:
+        # 결과가 이미 있으면 화면 유지(불필요 API 호출 방지)
+        if st.session_state.base_profile is not None and st.session_state.recs is not None:
+            profile = apply_feedback_adjustments(st.session_state.base_profile, st.session_state.feedback)
+            st.markdown(f"# {top_genre_title(profile)}")
+            st.write("이미 추천이 생성된 상태다. 👍/👎 피드백을 주고 **추천 새로 고침**을 누르면 추천이 더 정확해진다.")
+
+            recs = st.session_state.recs
+            if api_key or get_transport().mode == "replay":
+                # 언어만 바꾼 경우: 추천은 그대로 두고 표시 필드만 다시 붙인다(캐시됨)
+                recs = localize_movies(api_key, recs, language=language)
+            st.markdown("## 🎞️ 추천 영화")
+            cols = st.columns(3, gap="large")
+
+            for idx, movie in enumerate(recs):
+                col = cols[idx % 3]
+
+                mid = movie.get("id")
+                title = movie.get("title") or movie.get("original_title") or "제목 정보 없음"
+                vote = float(movie.get("vote_average", 0) or 0)
+                vcnt = int(movie.get("vote_count", 0) or 0)
+                overview = (movie.get("overview") or "").strip() or "줄거리 정보가 부족하다."
+                poster_url = build_poster_url(movie.get("poster_path"))
+                reason = build_reason(profile, movie)
+
+                with col:
+                    with card_container():
+                        if poster_url:
+                            st.image(poster_url, use_container_width=True)
+                        else:
+                            st.write("🖼️ 포스터 없음")
+
+                        st.markdown(f"### {title}")
+                        st.write(f"⭐ 평점: {vote:.1f}  (투표 {vcnt:,}개)")
+
+                        b1, b2 = st.columns(2)
+                        with b1:
+                            like_clicked = st.button("👍 좋아요", key=f"like_keep_{mid}_{idx}", use_container_width=True)
+                        with b2:
+                            dislike_clicked = st.button("👎 별로예요", key=f"dislike_keep_{mid}_{idx}", use_container_width=True)
+
+                        if like_clicked:
+                            add_feedback(movie, like=True)
+                            st.toast("좋아요 반영 완료! 새로 고침하면 더 맞춤 추천이 나온다.", icon="✅")
+
+                        if dislike_clicked:
+                            add_feedback(movie, like=False)
+                            st.toast("별로예요 반영 완료! 새로 고침하면 더 맞춤 추천이 나온다.", icon="✅")
+
+                        with st.expander("상세 정보"):
+                            st.write(f"**줄거리**: {overview}")
+                            st.write(f"**이 영화를 추천하는 이유**: {reason}")
+
+                        if st.button("🔎 비슷한 영화 더 보기", key=f"more_{mid}_{idx}", use_container_width=True):
+                            st.session_state.more_like = mid
+                        if st.session_state.more_like == mid:
+                            render_similar(api_key, movie, language=language)
+
+            st.markdown("---")
+            st.write("👉 피드백 후에는 **추천 새로 고침(피드백 반영)** 버튼을 눌러야 추천 리스트가 새로 계산된다.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+오프라인 도구 (Streamlit 서버 없이 실행)
+
+  python offline.py build-corpus --api-key KEY --out corpus.json
+  python offline.py verify --corpus corpus.json
+  python offline.py quant-report --corpus corpus.json --grids 0.02,0.05,0.1,0.2
+  python offline.py evaluate --corpus corpus.json --labels feedback_prior.json --params params.json --workers 4
+  python offline.py aggregate-feedback   # feedback_log.jsonl -> feedback_prior.json
+  python offline.py record --api-key KEY --fixtures tmdb_fixtures.json.gz --profiles 30
+  python offline.py profile --fixtures tmdb_fixtures.json.gz --iterations 50 --latency 0.05 --cprofile out.prof
+  py-spy record -o flame.svg -- python offline.py profile --fixtures tmdb_fixtures.json.gz --concurrency 8
+
+params.json 예시 (빠진 필드는 RankingConfig 기본값):
+  [{"name": "base"}, {"name": "diverse", "mmr_lam": 0.6}, {"w_genre": 0.5, "w_bayes": 0.18}]
+"""
+import argparse
+import cProfile
+import dataclasses
+import json
+import math
+import os
+import pstats
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import app
+
+
+# -----------------------------
+# 코퍼스(후보 영화 묶음)
+# -----------------------------
+def build_corpus(api_key: str, pages=2):
+    """장르별 discover 결과를 모아 한 번에 저장해 둔다."""
+    corpus = {}
+    for g in app.GENRES.values():
+        for page in range(1, pages + 1):
+            for m in app.movies_by_id(app.tmdb_discover(api_key, str(g["id"]), page=page)):
+                if m.get("id"):
+                    corpus[m["id"]] = m
+    return list(corpus.values())
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def pool_for_profile(profile, corpus):
+    """collect_candidates 흉내: 상위 3개 장르 중 하나라도 가진 영화."""
+    top = sorted(profile["genre_w"].items(), key=lambda x: x[1], reverse=True)[:3]
+    top_ids = {app.GENRES[k]["id"] for k, _ in top}
+    return [m for m in corpus if top_ids & set(m.get("genre_ids", []) or [])]
+
+def random_answers(n, seed=0):
+    rng = random.Random(seed)
+    return [[rng.randrange(4) for _ in app.QUESTIONS] for _ in range(n)]
+
+
+# -----------------------------
+# 참조 구현(딕셔너리 기반). 앱은 컬럼형(quality_filter_rows / mmr_select_rows)만 쓴다.
+# verify 명령으로 두 경로가 같은 결과를 내는지 확인한다.
+# -----------------------------
+def quality_filter(candidates, cfg=app.DEFAULT_RANKING):
+    thresholds = cfg.quality_thresholds
+    for t in thresholds:
+        filtered = [m for m in candidates if int(m.get("vote_count", 0) or 0) >= t]
+        if len(filtered) >= cfg.quality_min or t == thresholds[-1]:
+            return filtered
+    return candidates
+
+def mmr_select(candidates, base_scores, k=5, lam=app.DEFAULT_RANKING.mmr_lam):
+    selected = []
+    remaining = candidates[:]
+
+    remaining.sort(key=lambda m: base_scores.get(m["id"], -1e9), reverse=True)
+    if not remaining:
+        return selected
+    selected.append(remaining.pop(0))
+
+    while remaining and len(selected) < k:
+        best = None
+        best_mmr = -1e9
+        for m in remaining:
+            rel = base_scores.get(m["id"], -1e9)
+            sim = max(app.similarity(m, s) for s in selected) if selected else 0.0
+            mmr = lam * rel - (1 - lam) * sim
+            if mmr > best_mmr:
+                best_mmr = mmr
+                best = m
+        if best is None:
+            break
+        selected.append(best)
+        remaining = [x for x in remaining if x["id"] != best["id"]]
+    return selected
+
+def reference_rank(profile, pool, final_k=5, cfg=app.DEFAULT_RANKING):
+    c = quality_filter(pool, cfg)
+    scores = {m["id"]: app.composite_score(profile, m, cfg) for m in c}
+    top = sorted(c, key=lambda m: scores[m["id"]], reverse=True)[:cfg.pool_top]
+    return mmr_select(top, scores, k=final_k, lam=cfg.mmr_lam), scores
+
+def verify(corpus, n_profiles=300, final_k=5, seed=0, cfg=app.DEFAULT_RANKING):
+    """컬럼형 rank_candidates 와 참조 구현의 선택/점수가 다른 프로필 수."""
+    mismatches = 0
+    for a in random_answers(n_profiles, seed):
+        p = app.profile_from_answers(a)
+        pool = pool_for_profile(p, corpus)
+        ref_sel, ref_scores = reference_rank(p, pool, final_k, cfg)
+        sel, scores = app.rank_candidates(p, pool, final_k=final_k, cfg=cfg)
+        same_ids = [m["id"] for m in ref_sel] == [m["id"] for m in sel]
+        same_scores = ref_scores.keys() == scores.keys() and all(
+            abs(ref_scores[i] - scores[i]) < 1e-9 for i in ref_scores
+        )
+        if not (same_ids and same_scores):
+            mismatches += 1
+    return mismatches
+
+
+# -----------------------------
+# 양자화 간격별 적중률/품질 드리프트
+# -----------------------------
+def quant_report(corpus, grids, n_profiles=2000, final_k=5, seed=0, genre_grid=app.RESULT_CACHE_GENRE_GRID):
+    profiles = [app.profile_from_answers(a) for a in random_answers(n_profiles, seed)]
+
+    # 정확 계산은 간격과 무관하니 한 번만
+    exact = []
+    for p in profiles:
+        selected, scores = app.rank_candidates(p, pool_for_profile(p, corpus), final_k=final_k)
+        exact.append(([m["id"] for m in selected], scores))
+
+    rows = []
+    for grid in grids:
+        seen = {}
+        hits = 0
+        overlap_sum = 0.0
+        regret_sum = 0.0
+        for p, (ids, scores) in zip(profiles, exact):
+            key = app.quantize_profile(p, grid=grid, genre_grid=genre_grid)
+            if key not in seen:
+                seen[key] = ids
+                continue
+            hits += 1
+            cached = seen[key]
+            overlap_sum += len(set(cached) & set(ids)) / max(1, len(ids))
+            best = sum(scores.get(i, 0.0) for i in ids)
+            got = sum(scores.get(i, 0.0) for i in cached)
+            regret_sum += (best - got) / best if best > 0 else 0.0
+        rows.append({
+            "grid": grid,
+            "genre_grid": genre_grid,
+            "keys": len(seen),
+            "hit_rate": hits / len(profiles) if profiles else 0.0,
+            "overlap": overlap_sum / hits if hits else 1.0,
+            "regret": regret_sum / hits if hits else 0.0,
+        })
+    return rows
+
+def print_quant_report(rows):
+    print(f"{'grid':>6} {'g_grid':>6} {'keys':>6} {'hit_rate':>9} {'overlap@k':>10} {'regret':>8}")
+    for r in rows:
+        print(
+            f"{r['grid']:>6.3f} {r['genre_grid']:>6.3f} {r['keys']:>6d} {r['hit_rate']:>9.3f} "
+            f"{r['overlap']:>10.3f} {r['regret']:>8.4f}"
+        )
+
+
+# -----------------------------
+# 랭킹 파라미터 오프라인 평가
+# - 관련도 = 영화별 좋아요 비율 - 0.5 (aggregate-feedback 결과, 채점하는 설정과 무관)
+#   NDCG@k, 라벨 있는 추천 비율, 기본 설정 추천과의 일치도(별도 열)
+# - 추천 리스트 다양성(1 - 평균 쌍 유사도), 장르 커버리지, 평균 보정 평점, 실행 시간
+# -----------------------------
+def config_from_dict(d):
+    fields = {f.name for f in dataclasses.fields(app.RankingConfig)}
+    unknown = sorted(set(d) - fields - {"name"})
+    if unknown:
+        raise ValueError(f"unknown RankingConfig field(s) in {d.get('name', d)}: {', '.join(unknown)}")
+    kw = {k: v for k, v in d.items() if k in fields}
+    if "quality_thresholds" in kw:
+        kw["quality_thresholds"] = tuple(kw["quality_thresholds"])
+    return app.RankingConfig(**kw)
+
+def load_labels(path):
+    """aggregate-feedback 결과 -> movie_id -> 좋아요 비율 - 0.5 (app.load_feedback_prior와 같은 변환)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {int(mid): float(v["rate"]) - 0.5 for mid, v in data.items()}
+
+def ndcg(picked_rel, ideal_rel):
+    dcg = sum(max(r, 0.0) / math.log2(i + 2) for i, r in enumerate(picked_rel))
+    idcg = sum(max(r, 0.0) / math.log2(i + 2) for i, r in enumerate(ideal_rel))
+    return dcg / idcg if idcg > 0 else 0.0
+
+def list_diversity(movies):
+    if len(movies) < 2:
+        return 0.0
+    sims = [app.similarity(a, b) for i, a in enumerate(movies) for b in movies[i + 1:]]
+    return 1.0 - sum(sims) / len(sims)
+
+_W = {}
+
+def _init_worker(corpus_path, labels_path, n_profiles, seed, final_k, prior_path=None):
+    corpus = load_corpus(corpus_path)
+    labels = load_labels(labels_path)
+    # 사전값은 명시한 파일만 쓴다(작업 디렉터리에 남은 feedback_prior.json에 결과가 좌우되지 않게)
+    prior = load_labels(prior_path) if prior_path else {}
+    profiles = [app.profile_from_answers(a) for a in random_answers(n_profiles, seed)]
+    pools = [pool_for_profile(p, corpus) for p in profiles]
+    refs = []
+    for p, pool in zip(profiles, pools):
+        selected, _ = app.rank_candidates(p, pool, final_k=final_k, prior=prior)
+        # 이상값은 품질 필터 전 풀 전체의 관련도 상위 k (필터를 완화한 설정도 1을 넘지 않게)
+        ideal = sorted((labels.get(m["id"], 0.0) for m in pool), reverse=True)[:final_k]
+        refs.append(([m["id"] for m in selected], ideal))
+    _W.update(profiles=profiles, pools=pools, refs=refs, final_k=final_k, prior=prior, labels=labels)
+
+def evaluate_config(params):
+    cfg = config_from_dict(params)
+    k = _W["final_k"]
+    labels = _W["labels"]
+    rows = {"ndcg": [], "judged": [], "agree": [], "diversity": [], "coverage": [], "bayes": []}
+    t0 = time.perf_counter()
+    for p, pool, (ref_ids, ideal) in zip(_W["profiles"], _W["pools"], _W["refs"]):
+        selected, _ = app.rank_candidates(p, pool, final_k=k, cfg=cfg, prior=_W["prior"])
+        if ideal and ideal[0] > 0:
+            # 풀에 좋아요 쪽 라벨이 하나도 없으면 NDCG가 정의되지 않으니 빼고 평균낸다
+            rows["ndcg"].append(ndcg([labels.get(m["id"], 0.0) for m in selected], ideal))
+        rows["judged"].append(sum(1 for m in selected if m["id"] in labels) / max(1, len(selected)))
+        rows["agree"].append(len({m["id"] for m in selected} & set(ref_ids)) / max(1, len(ref_ids)))
+        rows["diversity"].append(list_diversity(selected))
+        rows["coverage"].append(len({g for m in selected for g in (m.get("genre_ids") or [])}))
+        rows["bayes"].append(np.mean([app.bayesian_rating(m.get("vote_average"), m.get("vote_count")) for m in selected]) if selected else 0.0)
+    elapsed = time.perf_counter() - t0
+
+    out = {"name": params["name"]}
+    out.update({k2: float(np.mean(v)) if v else 0.0 for k2, v in rows.items()})
+    out["ms_per_profile"] = 1000.0 * elapsed / max(1, len(_W["profiles"]))
+    return out
+
+def evaluate(corpus_path, labels_path, param_sets, n_profiles=500, final_k=5, seed=0, workers=None, prior_path=None):
+    param_sets = [{"name": f"set{i}", **p} for i, p in enumerate(param_sets)]
+    for p in param_sets:
+        config_from_dict(p)  # 워커를 띄우기 전에 오타부터 잡는다
+    initargs = (corpus_path, labels_path, n_profiles, seed, final_k, prior_path)
+    if workers == 1:
+        _init_worker(*initargs)
+        return [evaluate_config(p) for p in param_sets]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as ex:
+        return list(ex.map(evaluate_config, param_sets))
+
+def print_evaluation(rows):
+    print(f"{'name':<24} {'ndcg@k':>7} {'judged':>7} {'agree':>6} {'divers':>7} {'genres':>7} {'bayes':>6} {'ms/prof':>8}")
+    for r in rows:
+        print(
+            f"{r['name'][:24]:<24} {r['ndcg']:>7.3f} {r['judged']:>7.3f} {r['agree']:>6.3f} {r['diversity']:>7.3f} "
+            f"{r['coverage']:>7.2f} {r['bayes']:>6.2f} {r['ms_per_profile']:>8.2f}"
+        )
+
+
+# -----------------------------
+# 피드백 로그 배치 집계 -> 영화별 좋아요 비율(composite_score 사전값)
+# -----------------------------
+def aggregate_feedback(log_path=app.FEEDBACK_LOG, smoothing=2.0):
+    """(좋아요 + a) / (전체 + 2a) 로 스무딩해서 표본이 적은 영화가 튀지 않게 한다."""
+    counts = {}
+    for ev in app.read_events(log_path):
+        if ev.get("type") != "feedback" or not ev.get("movie_id"):
+            continue
+        c = counts.setdefault(int(ev["movie_id"]), [0, 0])
+        c[0 if ev.get("like") else 1] += 1
+    return {
+        str(mid): {
+            "likes": likes,
+            "dislikes": dislikes,
+            "rate": (likes + smoothing) / (likes + dislikes + 2 * smoothing),
+        }
+        for mid, (likes, dislikes) in counts.items()
+    }
+
+# -----------------------------
+# TMDB 녹화/재생 + 프로파일링
+# -----------------------------
+def record_fixtures(api_key, path, n_profiles=30, seed=0, languages=(app.BASE_LANGUAGE,), final_k=5):
+    """무작위 답변으로 전체 파이프라인을 돌려서 거치는 TMDB 응답을 모두 녹화한다."""
+    transport = app.TmdbTransport("record", path=path)
+    app.set_transport(transport)
+    for a in random_answers(n_profiles, seed):
+        selected, _, _ = app.generate_recommendations(api_key, app.profile_from_answers(a), final_k=final_k)
+        for lang in languages:
+            app.localize_movies(api_key, selected, language=lang)
+    transport.flush()
+    return len(transport)
+
+def profile_run(iterations=50, final_k=5, seed=0, concurrency=1, warm=False):
+    """
+    replay 전송 계층 위에서 generate_recommendations + 현지화를 반복한다.
+    concurrency개씩 묶어서 동시에 돌린다. warm=False면 묶음마다 한 번 tmdb_* 캐시를 비워서
+    (다른 스레드가 받는 중에 비우지 않도록) 전송 계층(지연/오류 주입)까지 매번 거친다.
+    concurrency=1이면 메인 스레드에서 돌아서 cProfile로 잡힌다.
+    """
+    answers = random_answers(iterations, seed)
+    batch = max(1, concurrency)
+
+    def one(a):
+        t0 = time.perf_counter()
+        try:
+            selected, _, _ = app.generate_recommendations("replay", app.profile_from_answers(a), final_k=final_k)
+            app.localize_movies("replay", selected)
+            ok = True
+        except app.requests.RequestException:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    results = []
+    ex = ThreadPoolExecutor(max_workers=batch) if batch > 1 else None
+    t0 = time.perf_counter()
+    try:
+        for i in range(0, len(answers), batch):
+            chunk = answers[i:i + batch]
+            if not warm:
+                app.clear_tmdb_cache()
+            results.extend(ex.map(one, chunk) if ex else [one(a) for a in chunk])
+    finally:
+        if ex:
+            ex.shutdown()
+    wall = time.perf_counter() - t0
+
+    timings = sorted(t for t, _ in results)
+    def pick(q):
+        return timings[min(len(timings) - 1, int(q * len(timings)))] if timings else 0.0
+
+    return {
+        "runs": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "wall_s": wall,
+        "mean_ms": 1000.0 * sum(timings) / max(1, len(timings)),
+        "p50_ms": 1000.0 * pick(0.50),
+        "p95_ms": 1000.0 * pick(0.95),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("build-corpus", help="TMDB에서 후보 코퍼스를 받아 JSON으로 저장")
+    p.add_argument("--api-key", required=True)
+    p.add_argument("--out", required=True)
+    p.add_argument("--pages", type=int, default=2)
+
+    p = sub.add_parser("verify", help="컬럼형 랭킹이 참조 구현과 같은 결과인지 확인")
+    p.add_argument("--corpus", required=True)
+    p.add_argument("--profiles", type=int, default=300)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("quant-report", help="양자화 간격별 캐시 적중률과 품질 드리프트")
+    p.add_argument("--corpus", required=True)
+    p.add_argument("--grids", default="0.02,0.05,0.1,0.2")
+    p.add_argument("--genre-grid", type=float, default=app.RESULT_CACHE_GENRE_GRID)
+    p.add_argument("--profiles", type=int, default=2000)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("evaluate", help="랭킹 파라미터 묶음들을 병렬로 재생해 지표 비교")
+    p.add_argument("--corpus", required=True)
+    p.add_argument("--params", required=True, help="RankingConfig 필드 오버라이드 목록(JSON)")
+    p.add_argument("--labels", default=app.FEEDBACK_PRIOR, help="관련도 라벨(aggregate-feedback 결과)")
+    p.add_argument("--profiles", type=int, default=500)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--prior", default=None, help="w_prior용 좋아요 비율 집계 파일(없으면 사전값 없이 평가, --labels와 같은 파일이면 정답이 새어 들어간다)")
+
+    p = sub.add_parser("aggregate-feedback", help="피드백 로그에서 영화별 좋아요 비율 집계")
+    p.add_argument("--log", default=app.FEEDBACK_LOG)
+    p.add_argument("--out", default=app.FEEDBACK_PRIOR)
+    p.add_argument("--smoothing", type=float, default=2.0)
+
+    p = sub.add_parser("record", help="실제 TMDB 응답을 픽스처 아카이브로 녹화")
+    p.add_argument("--api-key", required=True)
+    p.add_argument("--fixtures", default=app.TMDB_FIXTURES)
+    p.add_argument("--profiles", type=int, default=30)
+    p.add_argument("--languages", default=",".join(app.LANGUAGES.values()))
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("profile", help="녹화된 픽스처로 네트워크 없이 추천 파이프라인 프로파일링")
+    p.add_argument("--fixtures", default=app.TMDB_FIXTURES)
+    p.add_argument("--iterations", type=int, default=50)
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.0, help="요청당 지연(초)")
+    p.add_argument("--jitter", type=float, default=0.0, help="지연 흔들림 ±(초)")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--warm", action="store_true", help="tmdb_* 캐시를 반복 간 유지")
+    p.add_argument("--cprofile", default=None, help="cProfile 통계 저장 경로(--concurrency 1 전용)")
+    p.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build-corpus":
+        corpus = build_corpus(args.api_key, pages=args.pages)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False)
+        print(f"{len(corpus)} movies -> {args.out}")
+
+    elif args.cmd == "verify":
+        bad = verify(load_corpus(args.corpus), n_profiles=args.profiles, final_k=args.k, seed=args.seed)
+        print(f"{bad} / {args.profiles} profiles differ from the reference implementation")
+        if bad:
+            raise SystemExit(1)
+
+    elif args.cmd == "quant-report":
+        grids = [float(x) for x in args.grids.split(",") if x.strip()]
+        rows = quant_report(
+            load_corpus(args.corpus), grids, n_profiles=args.profiles, final_k=args.k,
+            seed=args.seed, genre_grid=args.genre_grid,
+        )
+        print_quant_report(rows)
+
+    elif args.cmd == "evaluate":
+        if not os.path.exists(args.labels):
+            parser.error(f"관련도 라벨 파일이 없다: {args.labels} (먼저 aggregate-feedback 실행)")
+        with open(args.params, encoding="utf-8") as f:
+            param_sets = json.load(f)
+        rows = evaluate(args.corpus, args.labels, param_sets, n_profiles=args.profiles, final_k=args.k, seed=args.seed, workers=args.workers, prior_path=args.prior)
+        print_evaluation(rows)
+
+    elif args.cmd == "aggregate-feedback":
+        prior = aggregate_feedback(args.log, smoothing=args.smoothing)
+        tmp = args.out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(prior, f)
+        os.replace(tmp, args.out)
+        print(f"{len(prior)} movies -> {args.out}")
+
+    elif args.cmd == "record":
+        languages = [x for x in args.languages.split(",") if x]
+        n = record_fixtures(args.api_key, args.fixtures, n_profiles=args.profiles, seed=args.seed, languages=languages)
+        print(f"{n} responses -> {args.fixtures}")
+
+    elif args.cmd == "profile":
+        if args.cprofile and args.concurrency > 1:
+            # cProfile은 켠 스레드만 본다. 동시 실행은 py-spy로 잡는다.
+            parser.error("--cprofile은 --concurrency 1에서만 쓸 수 있다 (동시 실행은 py-spy 사용)")
+        app.set_transport(app.TmdbTransport(
+            "replay", path=args.fixtures, latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, seed=args.seed,
+        ))
+        prof = cProfile.Profile() if args.cprofile else None
+        if prof:
+            prof.enable()
+        stats = profile_run(args.iterations, seed=args.seed, concurrency=args.concurrency, warm=args.warm)
+        if prof:
+            prof.disable()
+            prof.dump_stats(args.cprofile)
+            pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+        print(" ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()